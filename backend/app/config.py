@@ -26,6 +26,50 @@ class Settings(BaseSettings):
     # Convex
     convex_url: str = os.getenv("CONVEX_URL", "https://shiny-hornet-999.convex.cloud")
 
+    # Analysis scheduling
+    gemini_max_concurrency: int = 8
+    scheduler_interactive_weight: int = 4
+    scheduler_bulk_weight: int = 1
+    scheduler_interactive_reserved_slots: int = 2  # never given to bulk work
+    scheduler_per_classroom_fairness: bool = True
+    scheduler_metrics_window: int = 1000
+
+    # Deadlines (overall request budget, split across stages in order)
+    request_budget_seconds: float = 120.0
+    deadline_stage_shares: dict[str, float] = {
+        "download": 0.15,
+        "upload": 0.15,
+        "generation": 0.6,
+        "storage": 0.1,
+    }
+    # Budget that must remain for upload + generation when a slot is granted
+    deadline_min_gemini_seconds: float = 15.0
+    http_timeout_seconds: float = 30.0
+
+    # Hedged Gemini generation
+    gemini_hedge_enabled: bool = True
+    gemini_hedge_percentile: float = 0.95
+    gemini_hedge_min_samples: int = 20
+    gemini_hedge_initial_delay_seconds: float = 10.0
+    gemini_hedge_max_fraction: float = 0.05
+    gemini_hedge_burst: int = 5
+
+    # Convex query retries (queries are idempotent; mutations are not retried)
+    convex_query_retries: int = 2
+    convex_retry_base_delay_seconds: float = 0.2
+
+    # Token accounting and per-classroom budgets (input + output tokens)
+    classroom_token_budgets: dict[str, int] = {}
+    default_classroom_token_budget: int | None = None
+    gemini_economy_model: str = "gemini-2.0-flash-lite"
+    usage_reservation_tokens: int = 4000  # per-analysis estimate until measured
+
+    # Estimated USD per million tokens, by model
+    gemini_token_prices_per_million: dict[str, dict[str, float]] = {
+        "gemini-2.0-flash-exp": {"input": 0.10, "cached": 0.025, "output": 0.40},
+        "gemini-2.0-flash-lite": {"input": 0.075, "cached": 0.01875, "output": 0.30},
+    }
+
     class Config:
         case_sensitive: bool = False
 
@@ -2,7 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.services.gemini_service import gemini_service
-from app.routers import analysis
+from app.routers import analysis, usage
 
 app = FastAPI(
     title="ClassroomStudio AI Analysis",
@@ -21,6 +21,7 @@ app.add_middleware(
 
 # Register routers
 app.include_router(analysis.router, prefix="/api", tags=["analysis"])
+app.include_router(usage.router, prefix="/api", tags=["usage"])
 
 
 @app.get("/")
@@ -27,6 +27,44 @@ class AnalysisRequest(BaseModel):
     solution_file_url: str | None = Field(
         None, description="URL to teacher solution PDF (optional)"
     )
+    classroom_id: str | None = Field(
+        None,
+        description="Classroom ID, used for fair scheduling and token budgets",
+    )
+    assignment_id: str | None = Field(
+        None, description="Assignment ID, used for token accounting"
+    )
+    priority: Literal["interactive", "bulk"] = Field(
+        default="interactive",
+        description="Scheduling lane: interactive (single request) or bulk",
+    )
+
+
+class BatchAnalysisRequest(BaseModel):
+    """Request to analyze many submissions (e.g. a whole class) in the bulk lane"""
+
+    submissions: list[AnalysisRequest] = Field(..., min_length=1)
+
+
+class BatchAnalysisAccepted(BaseModel):
+    """Acknowledgement for a queued batch analysis"""
+
+    queued: int = Field(..., description="Number of submissions queued")
+
+
+class TokenUsage(BaseModel):
+    """Gemini token counts for one analysis"""
+
+    input_tokens: int = 0
+    cached_tokens: int = Field(0, description="Input tokens served from cache")
+    output_tokens: int = 0
+    hedge_calls: int = Field(0, description="Hedged second calls made")
+    hedge_input_tokens: int = Field(
+        0, description="Estimated input tokens billed for hedge losers"
+    )
+    hedge_output_tokens: int = Field(
+        0, description="Estimated output tokens billed for hedge losers"
+    )
 
 
 class AnalysisResponse(BaseModel):
@@ -56,6 +94,61 @@ class AnalysisResponse(BaseModel):
     comparison_included: bool = Field(
         default=False, description="Whether solution comparison was performed"
     )
+    usage: TokenUsage | None = Field(None, description="Gemini token counts")
+    economy_mode: bool = Field(
+        default=False,
+        description="Classroom over token budget: cheaper model, no comparison",
+    )
+    solution_skipped: bool = Field(
+        default=False,
+        description="Solution comparison skipped because of the token budget",
+    )
+
+
+class UsageSummary(BaseModel):
+    """Aggregated token usage and estimated cost"""
+
+    analyses: int = 0
+    input_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    hedge_calls: int = 0
+    hedge_input_tokens: int = 0
+    hedge_output_tokens: int = 0
+    estimated_cost_usd: float = Field(0.0, description="Includes hedge estimates")
+
+
+class AssignmentUsage(BaseModel):
+    """Token usage for one assignment"""
+
+    assignment_id: str
+    classroom_id: str | None = None
+    usage: UsageSummary
+
+
+class ClassroomUsage(BaseModel):
+    """Token usage and budget for one classroom"""
+
+    classroom_id: str
+    usage: UsageSummary
+    token_budget: int | None = Field(
+        None, description="Input + output token budget (None = unlimited)"
+    )
+    over_budget: bool = Field(
+        False, description="Recorded usage has reached the budget"
+    )
+    reserved_tokens: int = Field(
+        0, description="Estimated tokens held by analyses in flight"
+    )
+    assignments: dict[str, UsageSummary] = Field(default_factory=dict)
+
+
+class BudgetUpdate(BaseModel):
+    """Set or clear a classroom token budget"""
+
+    token_budget: int | None = Field(
+        None, ge=0, description="Input + output token budget (None = unlimited)"
+    )
 
 
 class AnalysisError(BaseModel):
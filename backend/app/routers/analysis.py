@@ -1,14 +1,23 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, status
 from app.models.schemas import (
     AnalysisRequest,
     AnalysisResponse,
     AnalysisError,
+    BatchAnalysisRequest,
+    BatchAnalysisAccepted,
+    TokenUsage,
     Weakness,
     Strength,
 )
 from app.services.pdf_service import pdf_service
 from app.services.gemini_analysis_service import gemini_analysis_service
 from app.services.convex_service import convex_service
+from app.services.analysis_scheduler import analysis_scheduler
+from app.services.deadlines import Deadline
+from app.services.usage_service import usage_service
+from app.config import settings
+from typing import Any
+import asyncio
 import time
 
 router = APIRouter()
@@ -28,8 +37,64 @@ async def analyze_submission(request: AnalysisRequest):
     2. Extract text from PDFs
     3. Run LangChain analysis pipeline (5 chained prompts)
     4. Return structured analysis results
+
+    The Gemini stage waits for a slot in the request's scheduling lane
+    (interactive by default), so bulk runs cannot starve single requests.
+    Each stage runs under its share of the request deadline (504 on expiry).
+    Classrooms over their token budget get the economy model and no
+    solution comparison.
+    """
+    return await _run_analysis(request)
+
+
+@router.post(
+    "/analyze-batch",
+    response_model=BatchAnalysisAccepted,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def analyze_batch(
+    request: BatchAnalysisRequest, background_tasks: BackgroundTasks
+):
+    """
+    Queue analysis for many submissions (e.g. a whole class) in the bulk lane
+
+    Results are stored in Convex as each submission finishes.
     """
+    submissions = [
+        s.model_copy(update={"priority": "bulk"}) for s in request.submissions
+    ]
+    background_tasks.add_task(_run_batch, submissions)
+    return BatchAnalysisAccepted(queued=len(submissions))
+
+
+@router.get("/scheduler/metrics")
+async def scheduler_metrics() -> dict[str, Any]:
+    """Per-lane queue depth and latency percentiles for the analysis scheduler"""
+    return analysis_scheduler.metrics()
+
+
+async def _run_batch(submissions: list[AnalysisRequest]) -> None:
+    # The scheduler's bulk admission gate is shared by all batch runs and
+    # sized to the bulk slot limit, so class runs don't open hundreds of
+    # downloads and status mutations (and hold every PDF in memory) while
+    # waiting for Gemini slots
+    async def run(submission: AnalysisRequest) -> AnalysisResponse:
+        async with analysis_scheduler.bulk_admission:
+            return await _run_analysis(submission)
+
+    results = await asyncio.gather(
+        *(run(s) for s in submissions), return_exceptions=True
+    )
+    for submission, result in zip(submissions, results):
+        if isinstance(result, BaseException):
+            print(
+                f"Warning: Batch analysis failed for {submission.submission_id}: {result}"
+            )
+
+
+async def _run_analysis(request: AnalysisRequest) -> AnalysisResponse:
     start_time = time.time()
+    deadline = Deadline.for_request()
 
     try:
         # Update submission status to "analyzing"
@@ -40,28 +105,64 @@ async def analyze_submission(request: AnalysisRequest):
         except Exception as e:
             print(f"Warning: Could not update submission status: {e}")
 
-        # Download student PDF (Convex signed URL or direct URL)
-        student_pdf_bytes = await pdf_service.download_pdf(request.student_file_url)
+        # Download student PDF (Convex signed URL or direct URL) and the
+        # solution PDF if provided, concurrently. Skip the solution when the
+        # classroom's recorded usage is already over budget, since economy
+        # mode won't compare
+        solution_file_url = request.solution_file_url
+        solution_skipped = False
+        if solution_file_url and usage_service.is_over_budget(request.classroom_id):
+            solution_file_url = None
+            solution_skipped = True
+        async with deadline.stage("download"):
+            student_pdf_bytes, solution_pdf_bytes = await asyncio.gather(
+                pdf_service.download_pdf(request.student_file_url),
+                _download_solution(solution_file_url),
+            )
+
+        # Run Gemini native PDF analysis once a slot in this lane is free
+        # Interactive requests fail in the queue once too little budget is
+        # left for upload and generation, rather than taking a slot (and
+        # starting an upload) they no longer have time to use
+        queue_timeout = None
+        if request.priority == "interactive":
+            queue_timeout = deadline.remaining_after(
+                settings.deadline_min_gemini_seconds
+            )
+        async with analysis_scheduler.slot(
+            request.priority, request.classroom_id, timeout=queue_timeout
+        ) as waited:
+            if request.priority == "bulk":
+                # Bulk runs queue by design; only interactive requests pay for it
+                deadline.extend(waited)
 
-        # Download solution PDF if provided
-        solution_pdf_bytes: bytes | None = None
-        if request.solution_file_url:
-            try:
-                solution_pdf_bytes = await pdf_service.download_pdf(
-                    request.solution_file_url
+            # Decide economy mode now rather than at request start, so a batch
+            # that queued up before any usage was recorded still sees the
+            # budget; the reservation holds an estimated cost while in flight
+            with usage_service.reservation(request.classroom_id) as economy_mode:
+                if economy_mode and solution_pdf_bytes:
+                    solution_pdf_bytes = None
+                    solution_skipped = True
+
+                analysis_result = await gemini_analysis_service.analyze_pdf(
+                    student_pdf_bytes=student_pdf_bytes,
+                    student_filename=f"submission_{request.submission_id}.pdf",
+                    solution_pdf_bytes=solution_pdf_bytes,
+                    solution_filename="solution.pdf" if solution_pdf_bytes else None,
+                    deadline=deadline,
+                    hedge=request.priority == "interactive",
+                    model=settings.gemini_economy_model if economy_mode else None,
+                )
+
+                # Account token usage against the classroom and assignment
+                usage = TokenUsage(**analysis_result.get("usage", {}))
+                model_used = analysis_result.get("model_used", "gemini-2.0-flash-exp")
+                usage_service.record(
+                    usage,
+                    model=model_used,
+                    classroom_id=request.classroom_id,
+                    assignment_id=request.assignment_id,
                 )
-            except Exception as e:
-                # Don't fail if solution download fails, just skip comparison
-                print(f"Warning: Failed to download solution PDF: {e}")
-                solution_pdf_bytes = None
-
-        # Run Gemini native PDF analysis
-        analysis_result = await gemini_analysis_service.analyze_pdf(
-            student_pdf_bytes=student_pdf_bytes,
-            student_filename=f"submission_{request.submission_id}.pdf",
-            solution_pdf_bytes=solution_pdf_bytes,
-            solution_filename="solution.pdf" if solution_pdf_bytes else None,
-        )
 
         # Convert to response models
         strengths = [Strength(**s) for s in analysis_result.get("strengths", [])]
@@ -77,26 +178,31 @@ async def analyze_submission(request: AnalysisRequest):
             weaknesses=weaknesses,
             summary=analysis_result.get("summary", "Analysis complete."),
             overall_score=None,  # Optional: could calculate from weaknesses
-            model_used="gemini-2.0-flash-exp",
+            model_used=model_used,
             processing_time_ms=processing_time_ms,
             comparison_included=analysis_result.get("comparison_included", False),
+            usage=usage,
+            economy_mode=economy_mode,
+            solution_skipped=solution_skipped,
         )
 
         # Store analysis results in Convex (in background, don't block response)
         try:
-            _ = await convex_service.store_analysis_results(
-                submission_id=request.submission_id,
-                analysis_data={
-                    "strengths": [s.model_dump() for s in strengths],
-                    "weaknesses": [w.model_dump() for w in weaknesses],
-                    "summary": response.summary,
-                    "overall_score": response.overall_score,
-                    "model_used": response.model_used,
-                    "processing_time_ms": processing_time_ms,
-                    "analyzed_at": int(time.time() * 1000),
-                    "confidence": 0.85,
-                },
-            )
+            async with deadline.stage("storage"):
+                _ = await convex_service.store_analysis_results(
+                    submission_id=request.submission_id,
+                    analysis_data={
+                        "strengths": [s.model_dump() for s in strengths],
+                        "weaknesses": [w.model_dump() for w in weaknesses],
+                        "summary": response.summary,
+                        "overall_score": response.overall_score,
+                        "model_used": response.model_used,
+                        "processing_time_ms": processing_time_ms,
+                        "analyzed_at": int(time.time() * 1000),
+                        "confidence": 0.85,
+                        "usage": usage.model_dump(),
+                    },
+                )
 
             # Update submission status to "analyzed"
             await convex_service.update_submission_status(
@@ -110,21 +216,39 @@ async def analyze_submission(request: AnalysisRequest):
 
     except HTTPException:
         raise
+    except TimeoutError:
+        await _reset_submission_status(request.submission_id)
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Analysis exceeded its time budget",
+        )
     except Exception as e:
-        # Try to reset submission status on error
-        try:
-            await convex_service.update_submission_status(
-                request.submission_id, "submitted"
-            )
-        except:
-            pass
-
+        await _reset_submission_status(request.submission_id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Analysis failed: {str(e)}",
         )
 
 
+async def _download_solution(url: str | None) -> bytes | None:
+    if not url:
+        return None
+    try:
+        return await pdf_service.download_pdf(url)
+    except Exception as e:
+        # Don't fail if solution download fails, just skip comparison
+        print(f"Warning: Failed to download solution PDF: {e}")
+        return None
+
+
+async def _reset_submission_status(submission_id: str) -> None:
+    # Try to reset submission status on error
+    try:
+        await convex_service.update_submission_status(submission_id, "submitted")
+    except:
+        pass
+
+
 @router.post("/test-analysis")
 async def test_analysis():
     """
@@ -0,0 +1,42 @@
+from fastapi import APIRouter
+from app.models.schemas import (
+    AssignmentUsage,
+    BudgetUpdate,
+    ClassroomUsage,
+)
+from app.services.usage_service import usage_service
+
+router = APIRouter()
+
+
+@router.get("/usage/classrooms", response_model=list[ClassroomUsage])
+async def list_classroom_usage():
+    """Token usage and budget status for every classroom seen since startup"""
+    return [
+        usage_service.classroom_usage(classroom_id)
+        for classroom_id in usage_service.classrooms
+    ]
+
+
+@router.get("/usage/classrooms/{classroom_id}", response_model=ClassroomUsage)
+async def get_classroom_usage(classroom_id: str):
+    """Token usage for a classroom, broken down by assignment"""
+    return usage_service.classroom_usage(classroom_id)
+
+
+@router.put("/usage/classrooms/{classroom_id}/budget", response_model=ClassroomUsage)
+async def set_classroom_budget(classroom_id: str, update: BudgetUpdate):
+    """
+    Set a classroom's token budget (null = unlimited)
+
+    Once exceeded, analyses for the classroom use the economy model and
+    skip solution comparison.
+    """
+    usage_service.set_budget(classroom_id, update.token_budget)
+    return usage_service.classroom_usage(classroom_id)
+
+
+@router.get("/usage/assignments/{assignment_id}", response_model=AssignmentUsage)
+async def get_assignment_usage(assignment_id: str):
+    """Token usage for an assignment"""
+    return usage_service.assignment_usage(assignment_id)
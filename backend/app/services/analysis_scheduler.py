@@ -0,0 +1,272 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Literal
+from app.config import settings
+
+Lane = Literal["interactive", "bulk"]
+
+
+class _LaneState:
+    """Waiters and latency samples for one priority lane"""
+
+    weight: int
+    limit: int | None
+    holding: int
+    pass_value: float
+    waiters: OrderedDict[str | None, deque[asyncio.Future[None]]]
+    in_flight: int
+    completed: int
+    wait_ms: deque[float]
+    total_ms: deque[float]
+
+    def __init__(self, weight: int, window: int, limit: int | None = None) -> None:
+        self.weight = max(1, weight)
+        self.limit = limit
+        self.holding = 0
+        self.pass_value = 0.0
+        self.waiters = OrderedDict()
+        self.in_flight = 0
+        self.completed = 0
+        self.wait_ms = deque(maxlen=window)
+        self.total_ms = deque(maxlen=window)
+
+    def queued(self) -> int:
+        return sum(len(q) for q in self.waiters.values())
+
+    def can_take(self) -> bool:
+        """Whether the lane is below its slot limit"""
+        return self.limit is None or self.holding < self.limit
+
+
+class AnalysisScheduler:
+    """
+    Weighted fair sharing of Gemini concurrency slots between lanes
+
+    Interactive requests (single student submissions) and bulk requests
+    (teacher-triggered class runs) wait in separate lanes. When a slot frees
+    up, the lane with the lowest stride-scheduling pass value is served, so
+    a lane with weight 4 gets four slots for every one given to a lane with
+    weight 1 while both have work queued. Within a lane, classrooms are
+    served round-robin so one large class cannot monopolise its lane.
+
+    Stride weights only matter while both lanes have waiters, so the bulk
+    lane is also capped below capacity: interactive_reserved_slots are never
+    given to bulk work, and an interactive request arriving during a bulk
+    run finds an idle slot instead of waiting for a bulk call to finish.
+    """
+
+    max_concurrency: int
+    per_classroom_fairness: bool
+    bulk_limit: int
+    bulk_admission: asyncio.Semaphore
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        weights: dict[Lane, int],
+        per_classroom_fairness: bool = True,
+        metrics_window: int = 1000,
+        interactive_reserved_slots: int = 0,
+    ) -> None:
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_classroom_fairness = per_classroom_fairness
+        self.bulk_limit = max(1, self.max_concurrency - interactive_reserved_slots)
+        # Shared by every batch run, so concurrent class runs together never
+        # have more submissions downloading/analyzing than bulk can hold slots
+        self.bulk_admission = asyncio.Semaphore(self.bulk_limit)
+        self._free = self.max_concurrency
+        self._global_pass = 0.0
+        self._lanes: dict[Lane, _LaneState] = {
+            lane: _LaneState(
+                weight,
+                metrics_window,
+                limit=self.bulk_limit if lane == "bulk" else None,
+            )
+            for lane, weight in weights.items()
+        }
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        lane: Lane = "interactive",
+        classroom_id: str | None = None,
+        timeout: float | None = None,
+    ) -> AsyncIterator[float]:
+        """
+        Hold one Gemini concurrency slot for the duration of the block
+
+        Yields the seconds spent queued for the slot. With a timeout, raises
+        TimeoutError if no slot is granted in time (the block never runs),
+        or straight away if the timeout is already zero or negative.
+        Example: async with analysis_scheduler.slot("bulk", cid) as waited: ...
+        """
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError("No time left to wait for a Gemini slot")
+
+        state = self._lanes[lane]
+        enqueued_at = time.perf_counter()
+        async with asyncio.timeout(timeout):
+            await self._acquire(lane, classroom_id)
+        started_at = time.perf_counter()
+        state.in_flight += 1
+        try:
+            yield started_at - enqueued_at
+        finally:
+            finished_at = time.perf_counter()
+            state.in_flight -= 1
+            state.completed += 1
+            state.wait_ms.append((started_at - enqueued_at) * 1000)
+            state.total_ms.append((finished_at - enqueued_at) * 1000)
+            self._release(state)
+
+    def try_acquire(self, lane: Lane = "interactive") -> bool:
+        """
+        Take a free slot without queueing, e.g. for a hedged call
+
+        Only succeeds when a slot is idle and nobody is waiting, so extra
+        work never delays queued requests. Pair each success with release().
+        """
+        state = self._lanes[lane]
+        if not self._has_free_slot(state):
+            return False
+
+        self._free -= 1
+        self._charge(state)
+        return True
+
+    def release(self, lane: Lane = "interactive") -> None:
+        """Return a slot taken with try_acquire()"""
+        self._release(self._lanes[lane])
+
+    async def _acquire(self, lane: Lane, classroom_id: str | None) -> None:
+        state = self._lanes[lane]
+
+        # Fast path: a slot is free and nobody is waiting ahead of us
+        if self._has_free_slot(state):
+            self._free -= 1
+            self._charge(state)
+            return
+
+        # A lane waking up from idle must not redeem credit it built up while empty
+        if not state.waiters:
+            state.pass_value = max(state.pass_value, self._global_pass)
+
+        key = classroom_id if self.per_classroom_fairness else None
+        future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        state.waiters.setdefault(key, deque()).append(future)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as we were cancelled: pass it on
+                self._release(state)
+            else:
+                self._discard(state, key, future)
+            raise
+
+    def _has_free_slot(self, state: _LaneState) -> bool:
+        """Idle slot the lane may take, with no eligible waiter ahead of it"""
+        return (
+            self._free > 0
+            and state.can_take()
+            and not any(s.waiters and s.can_take() for s in self._lanes.values())
+        )
+
+    def _release(self, state: _LaneState) -> None:
+        """Hand the freed slot to the next waiter, or return it to the pool"""
+        state.holding -= 1
+        while True:
+            next_state = self._next_lane()
+            if next_state is None:
+                self._free += 1
+                return
+
+            key, queue = next(iter(next_state.waiters.items()))
+            future = queue.popleft()
+            if queue:
+                # Round-robin: move this classroom behind the others in the lane
+                next_state.waiters.move_to_end(key)
+            else:
+                del next_state.waiters[key]
+
+            if future.done():
+                continue
+
+            self._charge(next_state)
+            future.set_result(None)
+            return
+
+    def _next_lane(self) -> _LaneState | None:
+        candidates = [s for s in self._lanes.values() if s.waiters and s.can_take()]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda s: s.pass_value)
+
+    def _charge(self, state: _LaneState) -> None:
+        state.holding += 1
+        state.pass_value = max(state.pass_value, self._global_pass)
+        self._global_pass = state.pass_value
+        state.pass_value += 1.0 / state.weight
+
+    def _discard(
+        self, state: _LaneState, key: str | None, future: asyncio.Future[None]
+    ) -> None:
+        queue = state.waiters.get(key)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            return
+        if not queue:
+            del state.waiters[key]
+
+    def metrics(self) -> dict[str, Any]:
+        """Per-lane queue depth, throughput and latency percentiles"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "free_slots": self._free,
+            "bulk_limit": self.bulk_limit,
+            "per_classroom_fairness": self.per_classroom_fairness,
+            "lanes": {
+                lane: {
+                    "weight": state.weight,
+                    "slot_limit": state.limit,
+                    "queued": state.queued(),
+                    "in_flight": state.in_flight,
+                    "completed": state.completed,
+                    "wait_ms": _percentiles(state.wait_ms),
+                    "latency_ms": _percentiles(state.total_ms),
+                }
+                for lane, state in self._lanes.items()
+            },
+        }
+
+
+def _percentiles(samples: deque[float]) -> dict[str, float | None]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        index = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return round(ordered[index], 1)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+# Singleton instance
+analysis_scheduler = AnalysisScheduler(
+    max_concurrency=settings.gemini_max_concurrency,
+    weights={
+        "interactive": settings.scheduler_interactive_weight,
+        "bulk": settings.scheduler_bulk_weight,
+    },
+    per_classroom_fairness=settings.scheduler_per_classroom_fairness,
+    metrics_window=settings.scheduler_metrics_window,
+    interactive_reserved_slots=settings.scheduler_interactive_reserved_slots,
+)
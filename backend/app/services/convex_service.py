@@ -1,4 +1,6 @@
+import asyncio
 import httpx
+import random
 from typing import Any
 from app.config import settings
 
@@ -23,14 +25,35 @@ class ConvexService:
         Call a Convex query function via HTTP
 
         Example: query("submissions:getSubmission", {"submissionId": "..."})
+
+        Queries are idempotent, so transport errors and 5xx responses are
+        retried with full-jitter exponential backoff.
         """
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                f"{self.api_url}/query",
-                json={"path": function_name, "args": args or {}, "format": "json"},
-            )
-            response.raise_for_status()
-            result = response.json()
+        retries = settings.convex_query_retries
+        for attempt in range(retries + 1):
+            try:
+                async with httpx.AsyncClient(
+                    timeout=settings.http_timeout_seconds
+                ) as client:
+                    response = await client.post(
+                        f"{self.api_url}/query",
+                        json={
+                            "path": function_name,
+                            "args": args or {},
+                            "format": "json",
+                        },
+                    )
+                    response.raise_for_status()
+                    result = response.json()
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = not isinstance(e, httpx.HTTPStatusError) or (
+                    e.response.status_code >= 500
+                )
+                if not retryable or attempt == retries:
+                    raise
+                backoff = settings.convex_retry_base_delay_seconds * 2**attempt
+                await asyncio.sleep(random.uniform(0, backoff))
+                continue
 
             # Convex returns {"status": "success", "value": ...} or {"status": "error", ...}
             if result.get("status") == "error":
@@ -46,7 +69,7 @@ class ConvexService:
 
         Example: mutation("aiAnalyses:createAnalysis", {...})
         """
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=settings.http_timeout_seconds) as client:
             response = await client.post(
                 f"{self.api_url}/mutation",
                 json={"path": function_name, "args": args or {}, "format": "json"},
@@ -138,6 +161,12 @@ class ConvexService:
                 "analyzedAt": int(analysis_data.get("analyzed_at", 0)),
             }
 
+            usage = analysis_data.get("usage")
+            if usage:
+                convex_data["inputTokens"] = usage.get("input_tokens", 0)
+                convex_data["cachedTokens"] = usage.get("cached_tokens", 0)
+                convex_data["outputTokens"] = usage.get("output_tokens", 0)
+
             # Call Convex mutation API to store analysis
             result = await self.mutation("aiAnalyses:createAnalysis", convex_data)
             return result
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from app.config import settings
+
+
+class Deadline:
+    """
+    Overall time budget for one request, split across pipeline stages
+
+    Each stage gets its configured share of whatever budget is still left,
+    relative to the stages that have not run yet, so time saved by a fast
+    download rolls forward to generation instead of being lost.
+    """
+
+    expires_at: float | None
+    stage_shares: dict[str, float]
+
+    def __init__(
+        self,
+        budget_seconds: float | None,
+        stage_shares: dict[str, float] | None = None,
+    ) -> None:
+        self.expires_at = (
+            time.monotonic() + budget_seconds if budget_seconds is not None else None
+        )
+        self.stage_shares = dict(stage_shares or settings.deadline_stage_shares)
+
+    @classmethod
+    def for_request(cls) -> "Deadline":
+        """Deadline using the configured request budget and stage split"""
+        return cls(settings.request_budget_seconds)
+
+    def remaining(self) -> float | None:
+        """Seconds left in the overall budget (None if unbounded)"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def remaining_after(self, reserve_seconds: float) -> float | None:
+        """
+        Seconds left once reserve_seconds are set aside for later stages
+
+        May be negative. Used to bound the scheduler queue wait so a request
+        still has time for its Gemini stages when it gets a slot.
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+        return remaining - reserve_seconds
+
+    def extend(self, seconds: float) -> None:
+        """Push the deadline back, e.g. to exclude time spent queued"""
+        if self.expires_at is not None:
+            self.expires_at += seconds
+
+    def stage_budget(self, stage: str) -> float | None:
+        """Seconds the given stage may use right now (None if unbounded)"""
+        remaining = self.remaining()
+        if remaining is None:
+            return None
+
+        stages = list(self.stage_shares)
+        if stage not in stages:
+            # Shares overridden without this stage: bound it by the overall budget
+            return remaining
+
+        pending = stages[stages.index(stage) :]
+        total = sum(self.stage_shares[s] for s in pending)
+        if total <= 0:
+            return remaining
+        return remaining * self.stage_shares[stage] / total
+
+    def stage(self, stage: str) -> asyncio.Timeout:
+        """
+        Timeout context for one stage; raises TimeoutError when it expires
+
+        Example: async with deadline.stage("download"): ...
+        """
+        return asyncio.timeout(self.stage_budget(stage))
@@ -1,7 +1,12 @@
 from google import genai
 from google.genai import types
 from app.config import settings
+from app.services.deadlines import Deadline
+from app.services.analysis_scheduler import analysis_scheduler
+from collections import deque
+import asyncio
 import json
+import time
 from typing import Any
 import io
 
@@ -11,10 +16,14 @@ class GeminiAnalysisService:
 
     client: genai.Client
     model_name: str
+    generation_latencies: deque[float]
+    hedge_tokens: float
 
     def __init__(self) -> None:
         self.client = genai.Client(api_key=settings.gemini_api_key)
         self.model_name = "gemini-2.0-flash-exp"
+        self.generation_latencies = deque(maxlen=500)
+        self.hedge_tokens = float(settings.gemini_hedge_burst)
 
     async def analyze_pdf(
         self,
@@ -22,36 +31,57 @@ class GeminiAnalysisService:
         student_filename: str,
         solution_pdf_bytes: bytes | None = None,
         solution_filename: str | None = None,
+        deadline: Deadline | None = None,
+        hedge: bool = False,
+        model: str | None = None,
     ) -> dict[str, Any]:
         """
         Analyze PDF using native Gemini document understanding
 
-        Returns dict with strengths, weaknesses, summary
-        """
+        Upload and generation run under their share of the request deadline
+        (raises TimeoutError when exceeded). With hedge=True, a slow
+        generation call gets a second attempt; see _generate. model overrides
+        the default model (e.g. a cheaper one for over-budget classrooms).
 
-        # Upload student PDF to Gemini
-        student_file = self._upload_pdf(student_pdf_bytes, student_filename)
+        Returns dict with strengths, weaknesses, summary, usage, model_used
+        """
+        deadline = deadline or Deadline(None)
+        model = model or self.model_name
 
-        # Upload solution PDF if provided
-        solution_file = None
-        if solution_pdf_bytes:
-            solution_file = self._upload_pdf(
-                solution_pdf_bytes, solution_filename or "solution.pdf"
-            )
+        # Upload student PDF (and solution PDF if provided) to Gemini
+        async with deadline.stage("upload"):
+            if solution_pdf_bytes:
+                student_file, solution_file = await asyncio.gather(
+                    self._upload_pdf(student_pdf_bytes, student_filename),
+                    self._upload_pdf(
+                        solution_pdf_bytes, solution_filename or "solution.pdf"
+                    ),
+                )
+            else:
+                student_file = await self._upload_pdf(
+                    student_pdf_bytes, student_filename
+                )
+                solution_file = None
 
         # Run analysis with prompt chaining
-        if solution_file:
-            result = await self._analyze_with_solution(student_file, solution_file)
-        else:
-            result = await self._analyze_without_solution(student_file)
+        async with deadline.stage("generation"):
+            if solution_file:
+                result = await self._analyze_with_solution(
+                    student_file, solution_file, hedge, model
+                )
+            else:
+                result = await self._analyze_without_solution(
+                    student_file, hedge, model
+                )
 
+        result["model_used"] = model
         return result
 
-    def _upload_pdf(self, pdf_bytes: bytes, filename: str) -> types.File:
+    async def _upload_pdf(self, pdf_bytes: bytes, filename: str) -> types.File:
         """Upload PDF to Gemini File API"""
         pdf_file = io.BytesIO(pdf_bytes)
 
-        uploaded = self.client.files.upload(
+        uploaded = await self.client.aio.files.upload(
             file=pdf_file,
             config=types.UploadFileConfig(
                 display_name=filename, mime_type="application/pdf"
@@ -61,7 +91,7 @@ class GeminiAnalysisService:
         return uploaded
 
     async def _analyze_without_solution(
-        self, student_file: types.File
+        self, student_file: types.File, hedge: bool = False, model: str | None = None
     ) -> dict[str, Any]:
         """Analyze student PDF without solution comparison"""
 
@@ -89,8 +119,9 @@ Output valid JSON only:
 
 Be extremely concise. Identify 3-5 weaknesses, 2-3 strengths. Focus on critical issues."""
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
+        response, usage = await self._generate(
+            hedge=hedge,
+            model=model,
             contents=[
                 types.Content(
                     role="user",
@@ -105,10 +136,16 @@ Be extremely concise. Identify 3-5 weaknesses, 2-3 strengths. Focus on critical
             ],
         )
 
-        return self._parse_response(response.text or "")
+        result = self._parse_response(response.text or "")
+        result["usage"] = usage
+        return result
 
     async def _analyze_with_solution(
-        self, student_file: types.File, solution_file: types.File
+        self,
+        student_file: types.File,
+        solution_file: types.File,
+        hedge: bool = False,
+        model: str | None = None,
     ) -> dict[str, Any]:
         """Analyze student PDF comparing against teacher solution"""
 
@@ -136,8 +173,9 @@ Output valid JSON only:
 
 Be extremely concise. Focus on differences from solution. Identify 3-5 weaknesses, 2-3 strengths."""
 
-        response = self.client.models.generate_content(
-            model=self.model_name,
+        response, usage = await self._generate(
+            hedge=hedge,
+            model=model,
             contents=[
                 types.Content(
                     role="user",
@@ -159,9 +197,155 @@ Be extremely concise. Focus on differences from solution. Identify 3-5 weaknesse
         )
 
         result = self._parse_response(response.text or "")
+        result["usage"] = usage
         result["comparison_included"] = True
         return result
 
+    async def _generate(
+        self,
+        contents: list[types.Content],
+        hedge: bool = False,
+        model: str | None = None,
+    ) -> tuple[types.GenerateContentResponse, dict[str, int]]:
+        """
+        Call generate_content, hedging slow calls with a second attempt
+
+        If the first call has not returned after the configured latency
+        percentile of recent calls, an identical second call is started.
+        Whichever succeeds first wins and the other is cancelled. Gemini
+        still bills the loser, whose usage is never returned, so it is
+        estimated (see _hedge_usage) and reported in the hedge_* counts.
+
+        Hedges are rate-limited by a token bucket (at most
+        gemini_hedge_max_fraction of calls, with a small burst) and only
+        fire when the scheduler has an idle slot, which the hedge holds
+        until it finishes, so they never exceed gemini_max_concurrency.
+        """
+        model = model or self.model_name
+        if not hedge or not settings.gemini_hedge_enabled:
+            response = await self._timed_generate(contents, model)
+            return response, self._usage(response)
+
+        self.hedge_tokens = min(
+            float(settings.gemini_hedge_burst),
+            self.hedge_tokens + settings.gemini_hedge_max_fraction,
+        )
+
+        primary = asyncio.create_task(self._timed_generate(contents, model))
+        tasks = {primary}
+        started = {primary: time.perf_counter()}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._hedge_delay())
+            if (
+                not done
+                and self.hedge_tokens >= 1
+                and analysis_scheduler.try_acquire("interactive")
+            ):
+                self.hedge_tokens -= 1
+                backup = asyncio.create_task(
+                    self._timed_generate(contents, model, record_cancelled=False)
+                )
+                # Done callbacks run even if the task is cancelled before starting
+                backup.add_done_callback(
+                    lambda _: analysis_scheduler.release("interactive")
+                )
+                tasks.add(backup)
+                started[backup] = time.perf_counter()
+
+            pending = tasks
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        response = task.result()
+                        usage = self._usage(response)
+                        if len(started) > 1:
+                            now = time.perf_counter()
+                            loser = next(t for t in started if t is not task)
+                            usage |= self._hedge_usage(
+                                usage, now - started[task], now - started[loser]
+                            )
+                        return response, usage
+                    error = task.exception()
+
+            raise error or Exception("Gemini generation failed")
+        finally:
+            for task in tasks:
+                if not task.done():
+                    _ = task.cancel()
+
+    async def _timed_generate(
+        self, contents: list[types.Content], model: str, record_cancelled: bool = True
+    ) -> types.GenerateContentResponse:
+        """
+        generate_content, recording its latency for the hedge threshold
+
+        A cancelled primary call (hedged and beaten, or deadline expiry) ran
+        at least this long, so its elapsed time is kept as a lower bound;
+        dropping it would hide the slow tail the threshold is based on. A
+        cancelled backup (record_cancelled=False) only lost a race it joined
+        late, so its truncated time is not a latency observation.
+        """
+        start = time.perf_counter()
+        try:
+            response = await self.client.aio.models.generate_content(
+                model=model, contents=contents
+            )
+        except asyncio.CancelledError:
+            if record_cancelled:
+                self.generation_latencies.append(time.perf_counter() - start)
+            raise
+        self.generation_latencies.append(time.perf_counter() - start)
+        return response
+
+    def _hedge_delay(self) -> float:
+        """Seconds to wait before hedging, from recent generation latencies"""
+        samples = self.generation_latencies
+        if len(samples) < settings.gemini_hedge_min_samples:
+            return settings.gemini_hedge_initial_delay_seconds
+
+        ordered = sorted(samples)
+        index = int(settings.gemini_hedge_percentile * (len(ordered) - 1))
+        return ordered[index]
+
+    def _usage(self, response: types.GenerateContentResponse) -> dict[str, int]:
+        """Token counts from the response's usage metadata (0 when missing)"""
+        counts = {
+            "input_tokens": 0,
+            "cached_tokens": 0,
+            "output_tokens": 0,
+            "hedge_calls": 0,
+            "hedge_input_tokens": 0,
+            "hedge_output_tokens": 0,
+        }
+        usage = response.usage_metadata
+        if usage is None:
+            return counts
+
+        counts["input_tokens"] = usage.prompt_token_count or 0
+        counts["cached_tokens"] = usage.cached_content_token_count or 0
+        counts["output_tokens"] = usage.candidates_token_count or 0
+        return counts
+
+    def _hedge_usage(
+        self, usage: dict[str, int], winner_elapsed: float, loser_elapsed: float
+    ) -> dict[str, int]:
+        """
+        Estimated tokens billed for the losing call of a hedged pair
+
+        The loser sent the same input as the winner; its output is the
+        winner's output prorated by how long the loser ran.
+        """
+        fraction = min(1.0, loser_elapsed / winner_elapsed) if winner_elapsed else 1.0
+        return {
+            "hedge_calls": 1,
+            "hedge_input_tokens": usage["input_tokens"],
+            "hedge_output_tokens": int(usage["output_tokens"] * fraction),
+        }
+
     def _parse_response(self, response_text: str) -> dict[str, Any]:
         """Parse JSON response from Gemini"""
         try:
@@ -1,4 +1,5 @@
 import httpx
+from app.config import settings
 
 
 class PDFService:
@@ -6,7 +7,7 @@ class PDFService:
 
     async def download_pdf(self, url: str) -> bytes:
         """Download PDF from URL (Convex signed URL or direct)"""
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with httpx.AsyncClient(timeout=settings.http_timeout_seconds) as client:
             response = await client.get(url)
             _ = response.raise_for_status()
             return response.content
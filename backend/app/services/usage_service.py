@@ -0,0 +1,174 @@
+from contextlib import contextmanager
+from typing import Iterator
+from app.config import settings
+from app.models.schemas import (
+    AssignmentUsage,
+    ClassroomUsage,
+    TokenUsage,
+    UsageSummary,
+)
+
+
+class UsageService:
+    """
+    In-process token and cost accounting per assignment and classroom
+
+    Totals live in memory and reset on restart; the per-analysis counts are
+    also stored on each aiAnalyses record in Convex. Budgets count input +
+    output tokens (Gemini's input count already includes cached tokens),
+    plus the estimated tokens of cancelled hedge calls.
+
+    Analyses in flight hold a reservation of their estimated token cost, so
+    a burst of concurrent requests cannot all slip under the budget before
+    any of them has recorded usage.
+    """
+
+    classrooms: dict[str, UsageSummary]
+    assignments: dict[str, UsageSummary]
+    assignment_classrooms: dict[str, str | None]
+    budgets: dict[str, int | None]
+    reserved: dict[str, int]
+
+    def __init__(self) -> None:
+        self.classrooms = {}
+        self.assignments = {}
+        self.assignment_classrooms = {}
+        self.budgets = dict(settings.classroom_token_budgets)
+        self.reserved = {}
+
+    def record(
+        self,
+        usage: TokenUsage,
+        model: str,
+        classroom_id: str | None = None,
+        assignment_id: str | None = None,
+    ) -> None:
+        """Add one analysis' token usage to its classroom and assignment"""
+        cost = self.estimate_cost(usage, model)
+
+        if classroom_id:
+            summary = self.classrooms.setdefault(classroom_id, UsageSummary())
+            self._add(summary, usage, cost)
+        if assignment_id:
+            summary = self.assignments.setdefault(assignment_id, UsageSummary())
+            self._add(summary, usage, cost)
+            self.assignment_classrooms[assignment_id] = classroom_id
+
+    def estimate_cost(self, usage: TokenUsage, model: str) -> float:
+        """Estimated USD cost from configured per-model prices (0 if unknown)"""
+        prices = settings.gemini_token_prices_per_million.get(model)
+        if not prices:
+            return 0.0
+
+        uncached = max(0, usage.input_tokens - usage.cached_tokens)
+        return (
+            uncached * prices.get("input", 0.0)
+            + usage.cached_tokens * prices.get("cached", prices.get("input", 0.0))
+            + usage.output_tokens * prices.get("output", 0.0)
+            + usage.hedge_input_tokens * prices.get("input", 0.0)
+            + usage.hedge_output_tokens * prices.get("output", 0.0)
+        ) / 1_000_000
+
+    def budget_for(self, classroom_id: str) -> int | None:
+        if classroom_id in self.budgets:
+            return self.budgets[classroom_id]
+        return settings.default_classroom_token_budget
+
+    def set_budget(self, classroom_id: str, token_budget: int | None) -> None:
+        """Override the configured budget for a classroom (None = unlimited)"""
+        self.budgets[classroom_id] = token_budget
+
+    def is_over_budget(self, classroom_id: str | None) -> bool:
+        """Whether recorded tokens reach the budget (reservations excluded)"""
+        if not classroom_id:
+            return False
+        return self._exceeds(classroom_id, self._recorded(classroom_id))
+
+    @contextmanager
+    def reservation(self, classroom_id: str | None) -> Iterator[bool]:
+        """
+        Reserve an analysis' estimated tokens; yields whether to use economy mode
+
+        Economy mode applies once recorded usage plus other analyses'
+        reservations reach the budget; this analysis' own estimate is not
+        pre-charged. The reservation is released when the block exits;
+        record() the actual usage inside the block.
+        """
+        if not classroom_id:
+            yield False
+            return
+
+        estimate = self._estimate_tokens(classroom_id)
+        in_flight = self.reserved.get(classroom_id, 0)
+        economy_mode = self._exceeds(
+            classroom_id, self._recorded(classroom_id) + in_flight
+        )
+        self.reserved[classroom_id] = self.reserved.get(classroom_id, 0) + estimate
+        try:
+            yield economy_mode
+        finally:
+            self.reserved[classroom_id] -= estimate
+            if self.reserved[classroom_id] <= 0:
+                del self.reserved[classroom_id]
+
+    def classroom_usage(self, classroom_id: str) -> ClassroomUsage:
+        return ClassroomUsage(
+            classroom_id=classroom_id,
+            usage=self.classrooms.get(classroom_id, UsageSummary()),
+            token_budget=self.budget_for(classroom_id),
+            over_budget=self.is_over_budget(classroom_id),
+            reserved_tokens=self.reserved.get(classroom_id, 0),
+            assignments={
+                assignment_id: summary
+                for assignment_id, summary in self.assignments.items()
+                if self.assignment_classrooms.get(assignment_id) == classroom_id
+            },
+        )
+
+    def assignment_usage(self, assignment_id: str) -> AssignmentUsage:
+        return AssignmentUsage(
+            assignment_id=assignment_id,
+            classroom_id=self.assignment_classrooms.get(assignment_id),
+            usage=self.assignments.get(assignment_id, UsageSummary()),
+        )
+
+    def _recorded(self, classroom_id: str) -> int:
+        summary = self.classrooms.get(classroom_id)
+        return _billed_tokens(summary) if summary else 0
+
+    def _exceeds(self, classroom_id: str, used: int) -> bool:
+        budget = self.budget_for(classroom_id)
+        if budget is None:
+            return False
+        # Nothing used or in flight yet: never start a classroom in economy mode
+        return used > 0 and used >= budget
+
+    def _estimate_tokens(self, classroom_id: str) -> int:
+        """Average tokens per analysis so far, or the configured default"""
+        summary = self.classrooms.get(classroom_id)
+        if not summary or not summary.analyses:
+            return settings.usage_reservation_tokens
+        return _billed_tokens(summary) // summary.analyses
+
+    def _add(self, summary: UsageSummary, usage: TokenUsage, cost: float) -> None:
+        summary.analyses += 1
+        summary.input_tokens += usage.input_tokens
+        summary.cached_tokens += usage.cached_tokens
+        summary.output_tokens += usage.output_tokens
+        summary.hedge_calls += usage.hedge_calls
+        summary.hedge_input_tokens += usage.hedge_input_tokens
+        summary.hedge_output_tokens += usage.hedge_output_tokens
+        summary.estimated_cost_usd += cost
+
+
+def _billed_tokens(summary: UsageSummary) -> int:
+    return (
+        summary.input_tokens
+        + summary.output_tokens
+        + summary.hedge_input_tokens
+        + summary.hedge_output_tokens
+    )
+
+
+# Singleton instance
+usage_service = UsageService()
@@ -0,0 +1,90 @@
+"""
+Tail-latency benchmark for hedged Gemini generation
+
+Runs GeminiAnalysisService._generate against a stubbed client whose calls
+are usually fast but occasionally much slower, with and without hedging,
+and prints p50/p95/p99 latency and how many calls were hedged.
+
+Usage (from backend/): python -m benchmarks.hedging
+"""
+
+import asyncio
+import os
+import random
+import time
+from types import SimpleNamespace
+
+# The service builds a real genai.Client at import; it never gets called here
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from app.services.gemini_analysis_service import GeminiAnalysisService  # noqa: E402
+
+CALLS = 1000
+WARMUP_CALLS = 100
+FAST_SECONDS = (0.02, 0.04)
+SLOW_PROBABILITY = 0.05
+SLOW_FACTOR = 10
+
+
+class StubModels:
+    """Stand-in for client.aio.models with a heavy-tailed latency profile"""
+
+    started: int
+    cancelled: int
+
+    def __init__(self) -> None:
+        self.started = 0
+        self.cancelled = 0
+
+    async def generate_content(self, model: str, contents: list) -> SimpleNamespace:
+        self.started += 1
+        delay = random.uniform(*FAST_SECONDS)
+        if random.random() < SLOW_PROBABILITY:
+            delay *= SLOW_FACTOR
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return SimpleNamespace(text="{}", usage_metadata=None)
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+async def run(hedge: bool) -> None:
+    random.seed(1)
+    service = GeminiAnalysisService()
+    models = StubModels()
+    service.client = SimpleNamespace(aio=SimpleNamespace(models=models))
+
+    # Fill the latency window so the hedge delay tracks the stub's p95
+    for _ in range(WARMUP_CALLS):
+        _ = await service._generate([], hedge=False)
+    models.started = 0
+
+    latencies: list[float] = []
+    for _ in range(CALLS):
+        start = time.perf_counter()
+        _ = await service._generate([], hedge=hedge)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    ordered = sorted(latencies)
+    print(
+        f"{'hedged' if hedge else 'plain':>6}: "
+        f"p50={percentile(ordered, 0.50):.0f}ms "
+        f"p95={percentile(ordered, 0.95):.0f}ms "
+        f"p99={percentile(ordered, 0.99):.0f}ms "
+        f"extra calls={models.started - CALLS} "
+        f"cancelled={models.cancelled}"
+    )
+
+
+async def main() -> None:
+    await run(hedge=False)
+    await run(hedge=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,87 @@
+"""
+Interactive latency under a bulk run, for AnalysisScheduler
+
+Simulates a 500-submission bulk run (through the shared bulk admission
+gate, as _run_batch does) while interactive requests keep arriving, and
+prints how long interactive requests wait for a Gemini slot. Runs with no
+bulk load, with bulk load and no reserved slots, and with bulk load and
+the default reserved slots.
+
+Usage (from backend/): python -m benchmarks.priority_lanes
+"""
+
+import asyncio
+import random
+
+from app.config import settings
+from app.services.analysis_scheduler import AnalysisScheduler
+
+SLOTS = 8
+BULK_SUBMISSIONS = 500
+CALL_SECONDS = (0.08, 0.12)
+INTERACTIVE_INTERVAL_SECONDS = 0.05
+INTERACTIVE_REQUESTS = 100
+
+
+async def gemini_call() -> None:
+    await asyncio.sleep(random.uniform(*CALL_SECONDS))
+
+
+async def scenario(name: str, bulk: bool, reserved_slots: int) -> None:
+    random.seed(1)
+    scheduler = AnalysisScheduler(
+        max_concurrency=SLOTS,
+        weights={
+            "interactive": settings.scheduler_interactive_weight,
+            "bulk": settings.scheduler_bulk_weight,
+        },
+        interactive_reserved_slots=reserved_slots,
+    )
+
+    async def bulk_submission(index: int) -> None:
+        async with scheduler.bulk_admission:
+            async with scheduler.slot("bulk", f"class-{index % 3}"):
+                await gemini_call()
+
+    waits: list[float] = []
+
+    async def interactive_request() -> None:
+        async with scheduler.slot("interactive") as waited:
+            waits.append(waited * 1000)
+            await gemini_call()
+
+    bulk_tasks = (
+        [asyncio.create_task(bulk_submission(i)) for i in range(BULK_SUBMISSIONS)]
+        if bulk
+        else []
+    )
+    # Let the bulk run saturate its slots before measuring
+    await asyncio.sleep(0.2)
+
+    interactive_tasks = []
+    for _ in range(INTERACTIVE_REQUESTS):
+        interactive_tasks.append(asyncio.create_task(interactive_request()))
+        await asyncio.sleep(INTERACTIVE_INTERVAL_SECONDS)
+    await asyncio.gather(*interactive_tasks)
+
+    for task in bulk_tasks:
+        _ = task.cancel()
+    _ = await asyncio.gather(*bulk_tasks, return_exceptions=True)
+
+    ordered = sorted(waits)
+    p50 = ordered[int(0.50 * (len(ordered) - 1))]
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    print(f"{name:>28}: interactive slot wait p50={p50:.0f}ms p95={p95:.0f}ms")
+
+
+async def main() -> None:
+    reserved = settings.scheduler_interactive_reserved_slots
+    await scenario("idle", bulk=False, reserved_slots=reserved)
+    await scenario("bulk run, 0 reserved slots", bulk=True, reserved_slots=0)
+    await scenario(
+        f"bulk run, {reserved} reserved slots", bulk=True, reserved_slots=reserved
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
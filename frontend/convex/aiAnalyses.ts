@@ -33,6 +33,9 @@ export const createAnalysis = mutation({
     modelUsed: v.string(),
     processingTime: v.number(),
     analyzedAt: v.number(),
+    inputTokens: v.optional(v.number()),
+    cachedTokens: v.optional(v.number()),
+    outputTokens: v.optional(v.number()),
   },
   handler: async (ctx, args) => {
     // Verify submission exists
@@ -59,6 +62,9 @@ export const createAnalysis = mutation({
         modelUsed: args.modelUsed,
         processingTime: args.processingTime,
         analyzedAt: args.analyzedAt,
+        inputTokens: args.inputTokens,
+        cachedTokens: args.cachedTokens,
+        outputTokens: args.outputTokens,
       });
       return existingAnalysis._id;
     }
@@ -75,6 +81,9 @@ export const createAnalysis = mutation({
       modelUsed: args.modelUsed,
       processingTime: args.processingTime,
       analyzedAt: args.analyzedAt,
+      inputTokens: args.inputTokens,
+      cachedTokens: args.cachedTokens,
+      outputTokens: args.outputTokens,
     });
 
     return analysisId;
@@ -149,6 +149,11 @@ const schema = defineSchema({
     modelUsed: v.string(), // Which AI model
     processingTime: v.number(), // milliseconds
     analyzedAt: v.number(),
+
+    // Gemini token usage
+    inputTokens: v.optional(v.number()),
+    cachedTokens: v.optional(v.number()), // subset of inputTokens
+    outputTokens: v.optional(v.number()),
   })
     .index("submission", ["submissionId"]),
 